@@ -0,0 +1,115 @@
+# SPDX-Copyright: 2025-present William Born
+# SPDX-License-Identifier: MIT
+"""Sidecar cache recording which input produced the current output file."""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Mapping, NamedTuple
+
+from mise_en_gitlab.__about__ import __version__
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+CACHE_FILENAME = ".mise-en-gitlab.cache.json"
+
+
+def cache_path_for(output_path: Path) -> Path:
+    """Return the sidecar cache path that lives next to the output file."""
+    return output_path.parent / CACHE_FILENAME
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _read_entry(cache_path: Path) -> Mapping[str, Any] | None:
+    try:
+        entry = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _entry_matches(
+    entry: Mapping[str, Any],
+    input_path: Path,
+    output_path: Path,
+    stats: tuple[os.stat_result, os.stat_result],
+) -> bool:
+    """Check the entry was written by this version for this input/output pair as-is."""
+    input_st, output_st = stats
+    return (
+        entry.get("version") == __version__
+        and entry.get("input_path") == str(input_path.resolve())
+        and entry.get("output_name") == output_path.name
+        and entry.get("input_size") == input_st.st_size
+        and entry.get("output_mtime_ns") == output_st.st_mtime_ns
+        and entry.get("output_size") == output_st.st_size
+    )
+
+
+class Freshness(NamedTuple):
+    """Outcome of checking the cache entry against the current input/output."""
+
+    fresh: bool
+    # Digest of the input when the check had to hash it, for reuse by the caller.
+    input_sha256: str | None = None
+
+
+def check_output_freshness(input_path: Path, output_path: Path) -> Freshness:
+    """Check whether the output was generated from the input as it is now.
+
+    The input is considered unchanged when its size and mtime match the entry;
+    if only the mtime differs (e.g. after a fresh checkout) the content hash
+    is compared instead. The output must still be the file we last wrote.
+    Nothing is written; a fresh result with a digest means the entry is stale
+    and can be refreshed with `record_output`.
+    """
+    entry = _read_entry(cache_path_for(output_path))
+    if entry is None:
+        return Freshness(fresh=False)
+    try:
+        stats = (os.stat(input_path), os.stat(output_path))
+    except OSError:
+        return Freshness(fresh=False)
+    if not _entry_matches(entry, input_path, output_path, stats):
+        return Freshness(fresh=False)
+    if entry.get("input_mtime_ns") == stats[0].st_mtime_ns:
+        return Freshness(fresh=True)
+    digest = _sha256(input_path)
+    return Freshness(fresh=entry.get("input_sha256") == digest, input_sha256=digest)
+
+
+def record_output(
+    input_path: Path, output_path: Path, *, input_sha256: str | None = None
+) -> None:
+    """Atomically write the cache entry for a freshly generated output.
+
+    `input_sha256` may be passed when the caller has already hashed the input.
+    Caching is best-effort: failures to write the sidecar are ignored.
+    """
+    cache_path = cache_path_for(output_path)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        input_st = os.stat(input_path)
+        output_st = os.stat(output_path)
+        entry = {
+            "version": __version__,
+            "input_path": str(input_path.resolve()),
+            "output_name": output_path.name,
+            "input_mtime_ns": input_st.st_mtime_ns,
+            "input_size": input_st.st_size,
+            "input_sha256": input_sha256 or _sha256(input_path),
+            "output_mtime_ns": output_st.st_mtime_ns,
+            "output_size": output_st.st_size,
+        }
+        tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
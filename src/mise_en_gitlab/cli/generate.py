@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2025-present William Born <william.born.git@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+"""`generate` subcommand"""
+
+import click
+
+
+@click.command("generate")
+@click.option(
+    "--in",
+    "in_path",
+    type=click.Path(path_type=str, exists=False, dir_okay=False),
+    default="mise.toml",
+    show_default=True,
+    help="Path to input mise.toml",
+)
+@click.option(
+    "--out",
+    "out_path",
+    type=click.Path(path_type=str, dir_okay=False),
+    default="generated-ci.yml",
+    show_default=True,
+    help="Path to write generated GitLab CI YAML",
+)
+@click.option(
+    "--no-cache",
+    "no_cache",
+    is_flag=True,
+    help="Always regenerate, ignoring the cache next to the output file",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
+def generate(in_path: str, out_path: str, *, no_cache: bool, verbose: bool) -> None:
+    """Generate GitLab CI YAML from mise.toml."""
+    # Deferred so listing commands in `--help` doesn't pay for yaml, tomllib and rich.
+    # pylint: disable=import-outside-toplevel
+    from pathlib import Path  # noqa: PLC0415
+
+    from mise_en_gitlab.core import ExitCode, run_generation  # noqa: PLC0415
+    from mise_en_gitlab.logging import init_cli_logging  # noqa: PLC0415
+
+    init_cli_logging(verbose=verbose)
+
+    input_file = Path(in_path)
+    output_file = Path(out_path)
+
+    if not input_file.exists():
+        click.secho(f"Input file not found: {input_file}", fg="red", err=True)
+        raise click.exceptions.Exit(ExitCode.MALFORMED_TOML_OR_SCHEMA)
+
+    exit_code, up_to_date, error = run_generation(
+        input_file, output_file, use_cache=not no_cache
+    )
+    if up_to_date:
+        click.secho(f"GitLab CI YAML up to date, not rewritten → {output_file}", fg="green")
+    elif exit_code == ExitCode.SUCCESS:
+        click.secho(f"Generated GitLab CI YAML → {output_file}", fg="green", err=False)
+    elif exit_code == ExitCode.INVALID_OR_MISSING_CI_TASKS:
+        click.secho(
+            "No CI-annotated tasks found. Add [tasks.<name>.ci] sections.",
+            fg="yellow",
+            err=True,
+        )
+    elif exit_code == ExitCode.MALFORMED_TOML_OR_SCHEMA:
+        click.secho(f"Malformed TOML or schema error: {error}", fg="red", err=True)
+    raise click.exceptions.Exit(exit_code)
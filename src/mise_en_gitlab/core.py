@@ -2,18 +2,79 @@
 # SPDX-License-Identifier: MIT
 """Core logic to parse mise.toml and generate GitLab CI YAML."""
 
+# TOML parsers only produce plain dict/list/str, so the hot paths use exact
+# type checks, which are cheaper than isinstance() against the Mapping ABC.
+# Tables and arrays still fall back to isinstance(), so other Mappings and list
+# subclasses keep working.
+# pylint: disable=unidiomatic-typecheck
+
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Iterable, Mapping, MutableMapping
+import contextlib
+import io
+import os
+import stat
+from functools import lru_cache
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+)
 
 import yaml
 
-# tomllib in 3.11+, tomli fallback for 3.8-3.10
-try:  # pragma: no cover - import path based on Python version
-    import tomllib as _toml
+from mise_en_gitlab.cache import Freshness, check_output_freshness, record_output
+
+# rtoml (Rust) when installed via the `fast` extra; otherwise tomllib in 3.11+,
+# tomli fallback for 3.8-3.10
+try:  # pragma: no cover - import path based on installed extras
+    import rtoml
 except ModuleNotFoundError:  # pragma: no cover
-    import tomli as _toml  # type: ignore[no-redef]
+    try:
+        import tomllib as _toml
+    except ModuleNotFoundError:
+        import tomli as _toml  # type: ignore[no-redef]
+
+    def _load_toml(path: Path) -> Any:
+        """Parse a TOML file with tomllib/tomli."""
+        with path.open("rb") as f:
+            return _toml.load(f)
+
+else:  # pragma: no cover
+
+    def _load_toml(path: Path) -> Any:
+        """Parse a TOML file with rtoml."""
+        return rtoml.load(path)
+
+
+# libyaml's C emitter when PyYAML was built with it; same output, several times faster
+try:  # pragma: no cover - depends on how PyYAML was built
+    from yaml import CSafeDumper as _BaseDumper
+except ImportError:  # pragma: no cover
+    from yaml import SafeDumper as _BaseDumper  # type: ignore[assignment]
+
+
+class _GitLabDumper(_BaseDumper):
+    """Safe dumper configured once at import for GitLab CI output."""
+
+    # pylint: disable=too-few-public-methods,too-many-ancestors
+
+    def ignore_aliases(self, data: Any) -> bool:  # noqa: ARG002 - PyYAML override signature
+        """Never emit anchors/aliases, even for values shared between jobs."""
+        return True
+
+
+_DUMP_OPTIONS: dict[str, Any] = {
+    "sort_keys": False,
+    "default_flow_style": False,
+    "allow_unicode": True,
+}
 
 
 class ExitCode:
@@ -25,8 +86,7 @@ class ExitCode:
     MALFORMED_TOML_OR_SCHEMA = 2
 
 
-@dataclass(frozen=True)
-class GenerationResult:
+class GenerationResult(NamedTuple):
     """Result of YAML generation."""
 
     yaml_text: str
@@ -34,6 +94,15 @@ class GenerationResult:
     jobs: list[str]
 
 
+class GenerationOutcome(NamedTuple):
+    """Result of a `generate` run: the exit code and whether the output was kept."""
+
+    exit_code: int
+    up_to_date: bool = False
+    # Schema error message to show the user, when generation was rejected.
+    error: str | None = None
+
+
 class NoCITasksError(Exception):
     """Raised when no CI-annotated tasks are found."""
 
@@ -42,23 +111,40 @@ class SchemaError(Exception):
     """Raised when input is structurally valid TOML, but fails schema expectations."""
 
 
-def _ensure_list(value: Any) -> list[Any]:
-    if value is None:
-        return []
-    if isinstance(value, list):
+def _as_table(value: Any) -> Mapping[str, Any] | None:
+    """Return `value` if it is a table (exact dict first, other Mappings as a fallback)."""
+    if type(value) is dict or isinstance(value, Mapping):
+        return value
+    return None
+
+
+def _as_list(value: Any) -> list[Any] | None:
+    """Return `value` if it is an array (exact list first, list subclasses as a fallback)."""
+    if type(value) is list or isinstance(value, list):
         return value
-    return [value]
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse_rule_string(item: str) -> tuple[str, str]:
+    """Split a "key: value" rule string; bare expressions become an `if` rule."""
+    key, sep, val = item.partition(":")
+    if sep:
+        return key.strip(), val.strip()
+    return "if", item
 
 
 def _normalize_rule_item(item: Any) -> dict[str, Any]:
     """Normalize a single rules item into a dict."""
-    if isinstance(item, dict):
+    if type(item) is dict:
         return item
-    if isinstance(item, str):
-        if ":" in item:
-            key, val = item.split(":", 1)
-            return {key.strip(): val.strip()}
-        return {"if": item}
+    if type(item) is str:
+        # The split is cached, but each job gets its own dict so no two jobs share
+        # a mutable rule that a caller of build_gitlab_ci_tree could edit.
+        key, val = _parse_rule_string(item)
+        return {key: val}
+    if isinstance(item, Mapping):
+        return dict(item)
     msg = "rules must be a list of strings or dicts"
     raise SchemaError(msg)
 
@@ -72,69 +158,65 @@ def _parse_rules(rules_value: Any) -> list[dict[str, Any]]:
     """
     if rules_value is None:
         return []
-    if isinstance(rules_value, list):
-        return [_normalize_rule_item(item) for item in rules_value]
+    rules = _as_list(rules_value)
+    if rules is not None:
+        return [_normalize_rule_item(item) for item in rules]
     msg = "rules must be a list"
     raise SchemaError(msg)
 
 
 def _read_default_image(data: Mapping[str, Any]) -> str | None:
     """Read [gitlab-ci.defaults].image if present."""
-    ci_top = data.get("gitlab-ci")
-    if isinstance(ci_top, Mapping):
-        defaults = ci_top.get("defaults")
-        if isinstance(defaults, Mapping):
-            img = defaults.get("image")
-            if isinstance(img, str) and img:
-                return img
-    return None
+    # Defaults are opt-in and usually absent, so look up optimistically.
+    try:
+        img = data["gitlab-ci"]["defaults"]["image"]
+    except (KeyError, TypeError):
+        return None
+    return img if type(img) is str and img else None
 
 
 def _parse_artifacts(artifacts_value: Any) -> dict[str, Any]:
     """Normalize artifacts into a dict as GitLab expects."""
     if artifacts_value is None:
         return {}
-    if isinstance(artifacts_value, dict):
+    if type(artifacts_value) is dict:
+        return dict(artifacts_value)
+    paths = _as_list(artifacts_value)
+    if paths is not None:
+        return {"paths": list(paths)}
+    if isinstance(artifacts_value, Mapping):
         return dict(artifacts_value)
-    if isinstance(artifacts_value, list):
-        return {"paths": list(artifacts_value)}
     msg = "artifacts must be a table/object or list of paths"
     raise SchemaError(msg)
 
 
-def _collect_stages(ci_tasks: Iterable[tuple[str, Mapping[str, Any]]]) -> list[str]:
-    stages: list[str] = []
-    seen = set()
-    for _, ci in ci_tasks:
-        stage = ci.get("stage")
-        if not isinstance(stage, str) or not stage:
-            msg = "each [gitlab-ci.jobs.<name>] must include non-empty 'stage'"
-            raise SchemaError(msg)
-        if stage not in seen:
-            seen.add(stage)
-            stages.append(stage)
-    return stages
+def _require_stage(ci: Mapping[str, Any]) -> str:
+    stage = ci.get("stage")
+    if type(stage) is not str or not stage:
+        msg = "each [gitlab-ci.jobs.<name>] must include non-empty 'stage'"
+        raise SchemaError(msg)
+    return stage
 
 
-def _iter_ci_tasks(
-    tasks: Mapping[str, Mapping[str, Any]],
-) -> Iterable[tuple[str, Mapping[str, Any]]]:
-    for task_name, task_body in tasks.items():
-        ci = task_body.get("ci")
-        if isinstance(ci, Mapping) and ci:
-            yield task_name, ci
+def _is_str_list(values: list[Any]) -> bool:
+    """Check every item is a str with a plain loop (no generator frame per call)."""
+    for item in values:  # noqa: SIM110 - all() over a generator is slower here
+        if type(item) is not str:
+            return False
+    return True
 
 
 def _normalize_script(run_value: Any) -> list[str]:
     if run_value is None:
         msg = "task missing required 'run' field"
         raise SchemaError(msg)
-    if isinstance(run_value, list):
-        if not all(isinstance(x, str) for x in run_value):
+    run_list = _as_list(run_value)
+    if run_list is not None:
+        if not _is_str_list(run_list):
             msg = "'run' list must contain only strings"
             raise SchemaError(msg)
-        return list(run_value)
-    if isinstance(run_value, str):
+        return list(run_list)
+    if type(run_value) is str:
         return [run_value]
     msg = "'run' must be a string or a list of strings"
     raise SchemaError(msg)
@@ -146,7 +228,7 @@ def _build_script(task_body: Mapping[str, Any]) -> list[str]:
     dir_value = task_body.get("dir")
     if dir_value is None:
         return script
-    if not isinstance(dir_value, str) or not dir_value.strip():
+    if type(dir_value) is not str or not dir_value.strip():
         msg = "'dir' must be a non-empty string"
         raise SchemaError(msg)
     return [f"cd {dir_value}", *script]
@@ -157,61 +239,140 @@ if TYPE_CHECKING:
     from pathlib import Path
 
 
-def _collect_passthrough(ci: Mapping[str, Any]) -> dict[str, Any]:
-    excluded = {"stage", "image", "rules", "artifacts", "needs", "name"}
-    return {k: v for k, v in ci.items() if k not in excluded}
-
-
-def _build_job_base(
-    task_body: Mapping[str, Any], ci: Mapping[str, Any], *, default_image: str | None
-) -> MutableMapping[str, Any]:
-    """Build base job fields (stage, image, script)."""
-    job: MutableMapping[str, Any] = {}
-    job["stage"] = ci.get("stage")
-    image = ci.get("image", default_image)
-    if image is not None:
-        job["image"] = image
-    job["script"] = _build_script(task_body)
-    return job
-
-
 def _parse_needs(needs_value: Any) -> list[str]:
     if needs_value is None:
         return []
-    if not isinstance(needs_value, list) or not all(isinstance(x, str) for x in needs_value):
+    needs = _as_list(needs_value)
+    if needs is None or not _is_str_list(needs):
         msg = "'needs' must be a list of job names (strings)"
         raise SchemaError(msg)
-    return list(needs_value)
+    return list(needs)
 
 
-def _apply_optional_fields(job: MutableMapping[str, Any], ci: Mapping[str, Any]) -> None:
-    parsed_rules = _parse_rules(ci.get("rules"))
+_FieldHandler = Callable[[MutableMapping[str, Any], str, Any], None]
+
+
+def _skip_field(_job: MutableMapping[str, Any], _key: str, _value: Any) -> None:
+    """Ignore keys already consumed by `_build_job` or only used for naming."""
+
+
+def _set_rules(job: MutableMapping[str, Any], _key: str, value: Any) -> None:
+    parsed_rules = _parse_rules(value)
     if parsed_rules:
         job["rules"] = parsed_rules
-    parsed_artifacts = _parse_artifacts(ci.get("artifacts"))
+
+
+def _set_artifacts(job: MutableMapping[str, Any], _key: str, value: Any) -> None:
+    parsed_artifacts = _parse_artifacts(value)
     if parsed_artifacts:
         job["artifacts"] = parsed_artifacts
-    needs = _parse_needs(ci.get("needs"))
+
+
+def _set_needs(job: MutableMapping[str, Any], _key: str, value: Any) -> None:
+    needs = _parse_needs(value)
     if needs:
         job["needs"] = needs
-    for key, value in _collect_passthrough(ci).items():
-        job[key] = value
+
+
+def _set_passthrough(job: MutableMapping[str, Any], key: str, value: Any) -> None:
+    job[key] = value
+
+
+# Keys of [gitlab-ci.jobs.<name>] that need normalizing; everything else passes through.
+_FIELD_HANDLERS: dict[str, _FieldHandler] = {
+    "stage": _skip_field,
+    "image": _skip_field,
+    "name": _skip_field,
+    "rules": _set_rules,
+    "artifacts": _set_artifacts,
+    "needs": _set_needs,
+}
 
 
 def _build_job(
     task_body: Mapping[str, Any], ci: Mapping[str, Any], *, default_image: str | None
 ) -> MutableMapping[str, Any]:
-    """Build a single GitLab job structure from task and its ci table."""
-    job = _build_job_base(task_body, ci, default_image=default_image)
-    _apply_optional_fields(job, ci)
+    """Build a single GitLab job structure from task and its ci table.
+
+    `stage`, `image` and `script` are emitted first; the remaining keys are
+    dispatched in a single pass over the ci table, in their TOML order.
+    """
+    job: MutableMapping[str, Any] = {"stage": ci.get("stage")}
+    image = ci.get("image", default_image)
+    if image is not None:
+        job["image"] = image
+    job["script"] = _build_script(task_body)
+    for key, value in ci.items():
+        _FIELD_HANDLERS.get(key, _set_passthrough)(job, key, value)
     return job
 
 
+_JobBuilder = Callable[..., MutableMapping[str, Any]]
+
+# A ci key layout is compiled into a straight-line builder once this many jobs
+# share it; below that, compiling costs more than the dispatch it saves.
+_SPECIALIZE_AFTER = 16
+
+
+def _job_builder_field_lines(keys: tuple[str, ...]) -> list[str]:
+    """Emit one statement per ci key, mirroring the `_FIELD_HANDLERS` dispatch."""
+    lines = []
+    for key in keys:
+        handler = _FIELD_HANDLERS.get(key, _set_passthrough)
+        if handler is _set_passthrough:
+            lines.append(f"    job[{key!r}] = ci[{key!r}]")
+        elif handler is not _skip_field:
+            lines.append(f"    {handler.__name__}(job, {key!r}, ci[{key!r}])")
+    return lines
+
+
+def _job_builder_source(keys: tuple[str, ...]) -> str:
+    """Generate the source of a `_build_job` equivalent for one ci key layout.
+
+    Keys are embedded with repr() and only ever used as subscripts; values from
+    the TOML never become part of the generated source.
+    """
+    stage_expr = 'ci["stage"]' if "stage" in keys else "None"
+    image_lines = (
+        ['    job["image"] = ci["image"]']
+        if "image" in keys
+        else ["    if default_image is not None:", '        job["image"] = default_image']
+    )
+    return "\n".join(
+        [
+            "def build(task_body, ci, *, default_image):",
+            f'    job = {{"stage": {stage_expr}}}',
+            *image_lines,
+            '    job["script"] = _build_script(task_body)',
+            *_job_builder_field_lines(keys),
+            "    return job",
+        ]
+    )
+
+
+@lru_cache(maxsize=128)
+def _compile_job_builder(keys: tuple[str, ...]) -> _JobBuilder:
+    """Compile a builder specialized to one ci key layout."""
+    namespace: dict[str, Any] = {"_build_script": _build_script}
+    namespace.update((h.__name__, h) for h in _FIELD_HANDLERS.values())
+    exec(_job_builder_source(keys), namespace)  # noqa: S102  # pylint: disable=exec-used
+    builder: _JobBuilder = namespace["build"]
+    return builder
+
+
+def _job_builder_for(ci: Mapping[str, Any], shapes: dict[tuple[str, ...], int]) -> _JobBuilder:
+    """Pick the generic or a specialized builder, counting layouts in `shapes`."""
+    keys = tuple(ci)
+    seen = shapes[keys] = shapes.get(keys, 0) + 1
+    if seen > _SPECIALIZE_AFTER:
+        return _compile_job_builder(keys)
+    return _build_job
+
+
 def parse_mise_toml(path: Path) -> Mapping[str, Any]:
     """Load and parse the `mise.toml` into a Python mapping."""
     try:
-        with path.open("rb") as f:
-            data = _toml.load(f)
+        data = _load_toml(path)
     except Exception as exc:  # pragma: no cover - exercised in integration test
         msg = f"Failed to parse TOML: {exc}"
         raise SchemaError(msg) from exc
@@ -223,64 +384,78 @@ def parse_mise_toml(path: Path) -> Mapping[str, Any]:
 
 def _iter_ci_jobs(data: Mapping[str, Any]) -> Iterable[tuple[str, Mapping[str, Any]]]:
     """Iterate jobs defined under [gitlab-ci.jobs]."""
-    ci_root = data.get("gitlab-ci")
-    if not isinstance(ci_root, Mapping):
+    ci_root = _as_table(data.get("gitlab-ci"))
+    if ci_root is None:
         return
-    jobs = ci_root.get("jobs")
-    if not isinstance(jobs, Mapping):
+    jobs = _as_table(ci_root.get("jobs"))
+    if jobs is None:
         return
     for job_task_key, job_body in jobs.items():
-        if isinstance(job_body, Mapping) and job_body:
-            yield job_task_key, job_body
+        job_cfg = _as_table(job_body)
+        if job_cfg:
+            yield job_task_key, job_cfg
 
 
 def _get_tasks_table(data: Mapping[str, Any]) -> Mapping[str, Any]:
-    tasks = data.get("tasks")
-    if not isinstance(tasks, Mapping):
+    tasks = _as_table(data.get("tasks"))
+    if tasks is None:
         msg = "No tasks found"
         raise NoCITasksError(msg)
     return tasks
 
 
-def _get_ci_jobs_or_error(data: Mapping[str, Any]) -> list[tuple[str, Mapping[str, Any]]]:
-    jobs = list(_iter_ci_jobs(data))
-    if not jobs:
-        msg = "No CI jobs found (missing [gitlab-ci.jobs.*] sections)"
-        raise NoCITasksError(msg)
-    return jobs
-
-
 def _final_job_key(task_key: str, job_cfg: Mapping[str, Any]) -> str:
     rename = job_cfg.get("name")
-    if isinstance(rename, str) and rename.strip():
-        return rename.strip()
-    return task_key
+    key = rename.strip() if type(rename) is str and rename.strip() else task_key
+    # `stages` is the document's own top-level key; a job there would overwrite it.
+    if key == "stages":
+        msg = f"Job name '{key}' is reserved by GitLab CI"
+        raise SchemaError(msg)
+    return key
 
 
-def build_gitlab_ci_structure(data: Mapping[str, Any]) -> GenerationResult:
-    """Build the GitLab CI structure from parsed mise data."""
+def _validate_needs(top: Mapping[str, Any], job_names: list[str]) -> None:
+    """Check every `needs` entry names a generated job, in one pass over all jobs."""
+    known = set(job_names)
+    for name in job_names:
+        for need in top[name].get("needs", ()):
+            if need not in known:
+                msg = f"Job '{name}' needs unknown job '{need}'"
+                raise SchemaError(msg)
+
+
+def build_gitlab_ci_tree(
+    data: Mapping[str, Any],
+) -> tuple[MutableMapping[str, Any], list[str], list[str]]:
+    """Build the GitLab CI document from parsed mise data.
+
+    Returns the top-level mapping along with the stage and job names.
+    """
     # Global defaults: [ci.defaults]
     default_image = _read_default_image(data)
 
     tasks = _get_tasks_table(data)  # for retrieving 'run'
-    ci_jobs = _get_ci_jobs_or_error(data)  # preserves TOML order
 
-    # Validate stages and collect stage order
-    stages = _collect_stages((name, ci) for name, ci in ci_jobs)
-
-    top: MutableMapping[str, Any] = {}
-    top["stages"] = stages
+    # Placeholder keeps `stages` as the first key of the document.
+    top: MutableMapping[str, Any] = {"stages": None}
+    stages: dict[str, None] = {}  # insertion-ordered set
 
     job_names: list[str] = []
+    shapes: dict[tuple[str, ...], int] = {}
+
+    # Single pass in TOML order: validate stage, build job, collect names.
+    for task_key, job_cfg in _iter_ci_jobs(data):
+        stages[_require_stage(job_cfg)] = None
 
-    for task_key, job_cfg in ci_jobs:
         # Determine script from corresponding task
-        task_body = tasks.get(task_key)
-        if not isinstance(task_body, Mapping):
+        task_body = _as_table(tasks.get(task_key))
+        if task_body is None:
             msg = f"Task '{task_key}' not found for gitlab-ci job"
             raise SchemaError(msg)
 
-        job = _build_job(task_body, job_cfg, default_image=default_image)
+        job = _job_builder_for(job_cfg, shapes)(
+            task_body, job_cfg, default_image=default_image
+        )
 
         # Optional rename of the final GitLab job key
         yaml_job_key = _final_job_key(task_key, job_cfg)
@@ -288,23 +463,126 @@ def build_gitlab_ci_structure(data: Mapping[str, Any]) -> GenerationResult:
         top[yaml_job_key] = job
         job_names.append(yaml_job_key)
 
-    yaml_text = yaml.safe_dump(top, sort_keys=False)
-    return GenerationResult(yaml_text=yaml_text, stages=stages, jobs=job_names)
+    if not job_names:
+        msg = "No CI jobs found (missing [gitlab-ci.jobs.*] sections)"
+        raise NoCITasksError(msg)
+    top["stages"] = stage_names = list(stages)
+
+    _validate_needs(top, job_names)
+    return top, stage_names, job_names
+
+
+def dump_gitlab_ci(top: Mapping[str, Any], stream: IO[str]) -> None:
+    """Emit the GitLab CI document as YAML directly into `stream`."""
+    yaml.dump(top, stream, Dumper=_GitLabDumper, **_DUMP_OPTIONS)
+
+
+def build_gitlab_ci_structure(data: Mapping[str, Any]) -> GenerationResult:
+    """Build the GitLab CI structure from parsed mise data, rendered to a string."""
+    top, stages, job_names = build_gitlab_ci_tree(data)
+    buffer = io.StringIO()
+    dump_gitlab_ci(top, buffer)
+    return GenerationResult(yaml_text=buffer.getvalue(), stages=stages, jobs=job_names)
 
 
-def generate_ci_yaml(input_path: Path, output_path: Path) -> int:
+# Large enough that typical pipelines are flushed in a single write() syscall.
+_OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+def _open_output(output_path: Path) -> IO[str]:
+    """Open a file for text writing through one large buffer.
+
+    The mode is 0o666 less the umask, as with `Path.write_text`. The parent
+    directory almost always exists, so it is only created when the first open fails.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        fd = os.open(output_path, flags, 0o666)
+    except FileNotFoundError:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(output_path, flags, 0o666)
+    try:
+        return os.fdopen(fd, "w", encoding="utf-8", buffering=_OUTPUT_BUFFER_SIZE)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def _copy_owner_and_mode(st: os.stat_result, path: Path) -> None:
+    """Give `path` the ownership (best-effort) and permission bits in `st`."""
+    if hasattr(os, "chown"):
+        with contextlib.suppress(OSError):
+            os.chown(path, st.st_uid, st.st_gid)
+    os.chmod(path, stat.S_IMODE(st.st_mode))
+
+
+@contextlib.contextmanager
+def _replacing_output(output_path: Path) -> Iterator[IO[str]]:
+    """Stream into a sibling temp file that replaces `output_path` on success.
+
+    Symlinks are followed, so the file they point at is the one replaced, and
+    an existing output keeps its mode and ownership. If rendering fails the temp
+    file is removed and the previous output is kept.
+    """
+    target = output_path.resolve()
+    try:
+        existing: os.stat_result | None = os.stat(target)
+    except FileNotFoundError:
+        existing = None
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        with _open_output(tmp_path) as stream:
+            yield stream
+        if existing is not None:
+            _copy_owner_and_mode(existing, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
+        raise
+
+
+def _check_cache(input_path: Path, output_path: Path) -> Freshness:
+    """Check the sidecar cache, refreshing an entry whose input only got a new mtime."""
+    freshness = check_output_freshness(input_path, output_path)
+    if freshness.fresh and freshness.input_sha256 is not None:
+        # Same content under a new mtime: refresh so later runs skip the hash.
+        record_output(input_path, output_path, input_sha256=freshness.input_sha256)
+    return freshness
+
+
+def run_generation(
+    input_path: Path, output_path: Path, *, use_cache: bool = True
+) -> GenerationOutcome:
     """Read input mise.toml, generate CI YAML, write to output path.
 
-    Returns an exit code per spec.
+    When `use_cache` is set and the sidecar cache shows the output was
+    generated from the input as it is now, nothing is parsed or written and
+    the outcome is marked `up_to_date`. The cache is checked once per run, and
+    the input is hashed at most once.
     """
+    freshness = _check_cache(input_path, output_path) if use_cache else Freshness(fresh=False)
+    if freshness.fresh:
+        return GenerationOutcome(ExitCode.SUCCESS, up_to_date=True)
+
     try:
         data = parse_mise_toml(input_path)
-        result = build_gitlab_ci_structure(data)
+        top, _, _ = build_gitlab_ci_tree(data)
     except NoCITasksError:
-        return ExitCode.INVALID_OR_MISSING_CI_TASKS
-    except SchemaError:
-        return ExitCode.MALFORMED_TOML_OR_SCHEMA
+        return GenerationOutcome(ExitCode.INVALID_OR_MISSING_CI_TASKS)
+    except SchemaError as exc:
+        return GenerationOutcome(ExitCode.MALFORMED_TOML_OR_SCHEMA, error=str(exc))
+
+    with _replacing_output(output_path) as stream:
+        dump_gitlab_ci(top, stream)
+    if use_cache:
+        record_output(input_path, output_path, input_sha256=freshness.input_sha256)
+    return GenerationOutcome(ExitCode.SUCCESS)
+
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(result.yaml_text, encoding="utf-8")
-    return ExitCode.SUCCESS
+def generate_ci_yaml(input_path: Path, output_path: Path, *, use_cache: bool = True) -> int:
+    """Read input mise.toml, generate CI YAML, write to output path.
+
+    Returns an exit code per spec; see `run_generation` for caching.
+    """
+    return run_generation(input_path, output_path, use_cache=use_cache).exit_code
@@ -4,34 +4,47 @@ from __future__ import annotations
 
 import logging
 import os
+import sys
 
-from rich.console import Console
-from rich.logging import RichHandler
 
+def _use_rich() -> bool:
+    """Only colorize for interactive terminals that haven't opted out via NO_COLOR."""
+    return sys.stderr.isatty() and not os.getenv("NO_COLOR")
 
-def setup_logging(
-    level: str = "INFO",
-    *,
-    show_time: bool = True,
-    show_path: bool = False,
-    rich_tracebacks: bool = True,
-) -> logging.Logger:
-    """Set up logging with rich handler.
+
+def _make_handler(
+    *, show_time: bool, show_path: bool, rich_tracebacks: bool
+) -> logging.Handler:
+    """Create a rich handler for terminals, or a plain stderr handler otherwise.
 
     Args:
-        level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         show_time (bool): Whether to show timestamps
         show_path (bool): Whether to show file paths
         rich_tracebacks (bool): Whether to use rich tracebacks
 
     Returns:
-        logging.Logger: Configured logger instance
+        logging.Handler: Handler writing to stderr
     """
+    if not _use_rich():
+        # Non-interactive (e.g. CI runners): skip importing rich entirely.
+        stream_handler = logging.StreamHandler(sys.stderr)
+        fmt = (
+            "%(asctime)s %(levelname)-8s %(message)s"
+            if show_time
+            else "%(levelname)-8s %(message)s"
+        )
+        stream_handler.setFormatter(logging.Formatter(fmt))
+        return stream_handler
+
+    # pylint: disable=import-outside-toplevel
+    from rich.console import Console  # noqa: PLC0415
+    from rich.logging import RichHandler  # noqa: PLC0415
+
     # Create console for rich output
     console = Console(stderr=True)
 
     # Configure rich handler
-    rich_handler = RichHandler(
+    return RichHandler(
         console=console,
         show_time=show_time,
         show_path=show_path,
@@ -41,15 +54,38 @@ def setup_logging(
         tracebacks_show_locals=False,
     )
 
+
+def setup_logging(
+    level: str = "INFO",
+    *,
+    show_time: bool = True,
+    show_path: bool = False,
+    rich_tracebacks: bool = True,
+) -> logging.Logger:
+    """Set up logging with rich handler, or plain stderr output when not on a TTY.
+
+    Args:
+        level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        show_time (bool): Whether to show timestamps
+        show_path (bool): Whether to show file paths
+        rich_tracebacks (bool): Whether to use rich tracebacks
+
+    Returns:
+        logging.Logger: Configured logger instance
+    """
+    handler = _make_handler(
+        show_time=show_time, show_path=show_path, rich_tracebacks=rich_tracebacks
+    )
+
     # Set log level
     numeric_level = getattr(logging, level.upper(), logging.INFO)
-    rich_handler.setLevel(numeric_level)
+    handler.setLevel(numeric_level)
 
     # Configure root logger
     logging.basicConfig(
         level=numeric_level,
         format="%(message)s",  # Rich handler handles formatting
-        handlers=[rich_handler],
+        handlers=[handler],
         force=True,  # Override any existing configuration
     )
 
@@ -74,8 +110,23 @@ def get_logger(name: str | None = None) -> logging.Logger:
     return logging.getLogger(name)
 
 
-# Global logger instance
-logger = get_logger()
+def __getattr__(name: str) -> logging.Logger:
+    """Create the module-level `logger` on first access (PEP 562).
+
+    Args:
+        name (str): Attribute name being looked up
+
+    Returns:
+        logging.Logger: The package logger, cached as a module global
+
+    Raises:
+        AttributeError: If `name` is not a lazily created attribute
+    """
+    if name == "logger":
+        globals()["logger"] = instance = get_logger()
+        return instance
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
 
 def init_cli_logging(*, verbose: bool = False) -> logging.Logger:
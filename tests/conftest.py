@@ -0,0 +1,104 @@
+# SPDX-FileCopyrightText: 2025-present William Born <william.born.git@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+"""Shared pytest fixtures and configuration."""
+
+from __future__ import annotations
+
+import contextlib
+import itertools
+import os
+import re
+import shutil
+from pathlib import Path
+
+import pytest
+from _pytest.pathlib import LOCK_TIMEOUT, make_numbered_dir_with_cleanup
+from click.testing import CliRunner
+
+# RAM-backed tmpfs on Linux; tests write a mise.toml and read back YAML each run.
+_SHM = Path("/dev/shm")
+_SHM_SESSION_DIR = pytest.StashKey[Path]()
+# Failed runs keep their basetemp for inspection; like pytest, keep the last 3.
+_SHM_KEEP = 3
+
+_tmp_path_ids = itertools.count()
+
+
+def _shm_root() -> Path | None:
+    """Return this user's private directory on tmpfs, or None if it can't be used."""
+    root = _SHM / f"pytest-mise-en-gitlab-of-{os.getuid()}"
+    try:
+        root.mkdir(mode=0o700, exist_ok=True)
+        st = root.lstat()
+    except OSError:
+        return None
+    # /dev/shm is shared: only use a real directory that we own.
+    if root.is_symlink() or st.st_uid != os.getuid():
+        return None
+    return root
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config) -> None:
+    """Put `tmp_path` on tmpfs when available, unless --basetemp was given.
+
+    Must run before pytest's tmpdir plugin reads the option. xdist workers
+    inherit a basetemp from the controller, so they are left alone. Session
+    directories are numbered and locked the way pytest's own are, so retention
+    never removes the directory of a session that is still running.
+    """
+    if config.option.basetemp is not None or hasattr(config, "workerinput"):
+        return
+    root = _shm_root() if _SHM.is_dir() else None
+    if root is None:
+        return
+    cleanups = contextlib.ExitStack()
+    config.add_cleanup(cleanups.close)
+    session_dir = make_numbered_dir_with_cleanup(
+        root=root,
+        prefix="run-",
+        mode=0o700,
+        keep=_SHM_KEEP,
+        lock_timeout=LOCK_TIMEOUT,
+        register=cleanups.callback,
+    )
+    config.stash[_SHM_SESSION_DIR] = session_dir
+    # pytest empties a given --basetemp, so keep the lock file one level up.
+    config.option.basetemp = str(session_dir / "basetemp")
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    """Drop the tmpfs basetemp after a passing run; keep it to inspect failures.
+
+    Runs last so that xdist workers have shut down and stopped writing to it.
+    """
+    session_dir = session.config.stash.get(_SHM_SESSION_DIR, None)
+    if session_dir is not None and exitstatus == 0:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="module")
+def runner() -> CliRunner:
+    """One CliRunner per test module; it keeps no state between invocations."""
+    return CliRunner()
+
+
+@pytest.fixture(name="mise_tmp_base", scope="session")
+def _mise_tmp_base(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """One base directory for every test's `tmp_path` in this session."""
+    return tmp_path_factory.mktemp("mise_en_gitlab")
+
+
+@pytest.fixture(name="tmp_path")
+def _tmp_path(request: pytest.FixtureRequest, mise_tmp_base: Path) -> Path:
+    """Per-test subdirectory of the session base, overriding pytest's `tmp_path`.
+
+    Skips pytest's per-test numbered-dir bookkeeping; the whole base is removed
+    with the session's basetemp.
+    """
+    name = re.sub(r"\W", "_", request.node.name)[:30]
+    path = mise_tmp_base / f"{next(_tmp_path_ids)}-{name}"
+    path.mkdir()
+    return path
@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: 2025-present William Born <william.born.git@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+"""Helpers shared by the test modules."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from textwrap import dedent
+from typing import TYPE_CHECKING, Any
+
+import click
+import yaml
+
+from mise_en_gitlab.cli import mise_en_gitlab
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _resolve_generate() -> click.Command:
+    command = mise_en_gitlab.get_command(click.Context(mise_en_gitlab), "generate")
+    assert command is not None
+    return command
+
+
+# The `generate` subcommand, resolved through the lazy group once per session.
+GENERATE = _resolve_generate()
+
+# Resolved once: libyaml's loader when available, without safe_load's per-call indirection.
+_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@lru_cache(maxsize=None)
+def _prep(content: str) -> str:
+    """Dedent a fixture literal once; the same literals are reused across runs."""
+    return dedent(content).strip() + "\n"
+
+
+def write_fixture(tmp_path: Path, name: str, content: str) -> Path:
+    """Write a dedented fixture file under `tmp_path` and return its path."""
+    p = tmp_path / name
+    p.write_text(_prep(content), encoding="utf-8")
+    return p
+
+
+def load_yaml(path: Path) -> dict[str, Any]:
+    """Parse a generated YAML file."""
+    # Bytes go straight to the (C) reader, skipping a Python-level UTF-8 decode.
+    data: dict[str, Any] = yaml.load(path.read_bytes(), Loader=_LOADER)
+    return data
@@ -5,27 +5,25 @@
 
 from __future__ import annotations
 
-from textwrap import dedent
+import hashlib
+import json
+import os
+import stat
 from typing import TYPE_CHECKING
 
-import yaml
-from click.testing import CliRunner
-
 from mise_en_gitlab.cli import mise_en_gitlab
+from tests.helpers import GENERATE, load_yaml, write_fixture
 
 if TYPE_CHECKING:
     from pathlib import Path
 
-
-def _write(tmp_path: Path, name: str, content: str) -> Path:
-    p = tmp_path / name
-    p.write_text(dedent(content).strip() + "\n", encoding="utf-8")
-    return p
+    import pytest
+    from click.testing import CliRunner
 
 
-def test_generate_success(tmp_path: Path) -> None:
+def test_generate_success(tmp_path: Path, runner: CliRunner) -> None:
     """End-to-end: generate expected YAML from sample mise.toml."""
-    mise = _write(
+    mise = write_fixture(
         tmp_path,
         "mise.toml",
         """
@@ -55,14 +53,13 @@ def test_generate_success(tmp_path: Path) -> None:
         """,
     )
     output = tmp_path / "generated-ci.yml"
-    runner = CliRunner()
     result = runner.invoke(
         mise_en_gitlab, ["generate", "--in", str(mise), "--out", str(output)]
     )
     assert result.exit_code == 0, result.output
     assert output.exists()
 
-    data = yaml.safe_load(output.read_text(encoding="utf-8"))
+    data = load_yaml(output)
     assert data["stages"] == ["build", "test", "deploy"]
 
     assert "build" in data
@@ -85,9 +82,27 @@ def test_generate_success(tmp_path: Path) -> None:
     assert data["deploy"]["needs"] == ["build", "test"]
 
 
-def test_generate_no_ci_tasks_exit_1(tmp_path: Path) -> None:
+def test_generate_creates_missing_output_dirs(tmp_path: Path, runner: CliRunner) -> None:
+    """Missing parent directories of --out are created."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "nested" / "dir" / "ci.yml"
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out)])
+    assert result.exit_code == 0, result.output
+    assert load_yaml(out)["stages"] == ["build"]
+
+
+def test_generate_no_ci_tasks_exit_1(tmp_path: Path, runner: CliRunner) -> None:
     """Return exit code 1 when no [tasks.*.ci] present."""
-    mise = _write(
+    mise = write_fixture(
         tmp_path,
         "mise.toml",
         """
@@ -96,16 +111,14 @@ def test_generate_no_ci_tasks_exit_1(tmp_path: Path) -> None:
         """,
     )
     out = tmp_path / "ci.yml"
-    result = CliRunner().invoke(
-        mise_en_gitlab, ["generate", "--in", str(mise), "--out", str(out)]
-    )
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out)])
     assert result.exit_code == 1
     assert not out.exists()
 
 
-def test_generate_malformed_toml_exit_2(tmp_path: Path) -> None:
+def test_generate_malformed_toml_exit_2(tmp_path: Path, runner: CliRunner) -> None:
     """Return exit code 2 on malformed TOML."""
-    mise = _write(
+    mise = write_fixture(
         tmp_path,
         "mise.toml",
         """
@@ -114,16 +127,14 @@ def test_generate_malformed_toml_exit_2(tmp_path: Path) -> None:
         """,
     )
     out = tmp_path / "ci.yml"
-    result = CliRunner().invoke(
-        mise_en_gitlab, ["generate", "--in", str(mise), "--out", str(out)]
-    )
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out)])
     assert result.exit_code == 2
     assert not out.exists()
 
 
-def test_missing_stage_in_ci_exit_2(tmp_path: Path) -> None:
+def test_missing_stage_in_ci_exit_2(tmp_path: Path, runner: CliRunner) -> None:
     """Require 'stage' in [gitlab-ci.jobs.*]."""
-    mise = _write(
+    mise = write_fixture(
         tmp_path,
         "mise.toml",
         """
@@ -134,8 +145,227 @@ def test_missing_stage_in_ci_exit_2(tmp_path: Path) -> None:
         """,
     )
     out = tmp_path / "ci.yml"
-    result = CliRunner().invoke(
-        mise_en_gitlab, ["generate", "--in", str(mise), "--out", str(out)]
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out)])
+    assert result.exit_code == 2
+    assert not out.exists()
+
+
+def test_schema_error_message_is_shown(tmp_path: Path, runner: CliRunner) -> None:
+    """Schema errors report what was rejected, not just the exit code."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.deploy]
+        run = "./deploy.sh"
+        [gitlab-ci.jobs.deploy]
+        stage = "deploy"
+        needs = ["ext-job"]
+        """,
     )
+    out = tmp_path / "ci.yml"
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out)])
     assert result.exit_code == 2
+    assert "Job 'deploy' needs unknown job 'ext-job'" in result.output
     assert not out.exists()
+
+
+def test_failed_render_keeps_previous_output(tmp_path: Path, runner: CliRunner) -> None:
+    """A value YAML can't represent leaves the last good output untouched."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        start_in = 07:32:00
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    out.write_text("previous: output\n", encoding="utf-8")
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out), "--no-cache"])
+    assert result.exit_code != 0
+    assert out.read_text(encoding="utf-8") == "previous: output\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ci.yml", "mise.toml"]
+
+
+def test_existing_output_keeps_mode(tmp_path: Path, runner: CliRunner) -> None:
+    """Regenerating over an existing output keeps its permission bits."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    out.write_text("previous: output\n", encoding="utf-8")
+    out.chmod(0o600)
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out), "--no-cache"])
+    assert result.exit_code == 0
+    assert stat.S_IMODE(out.stat().st_mode) == 0o600
+    assert load_yaml(out)["build"]["script"] == ["make"]
+
+
+def test_symlinked_output_writes_through_link(tmp_path: Path, runner: CliRunner) -> None:
+    """A symlinked output stays a symlink; the file it points at gets the YAML."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    target = tmp_path / "real" / "ci.yml"
+    target.parent.mkdir()
+    target.write_text("previous: output\n", encoding="utf-8")
+    out = tmp_path / "ci.yml"
+    out.symlink_to(target)
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out), "--no-cache"])
+    assert result.exit_code == 0
+    assert out.is_symlink()
+    assert load_yaml(target)["build"]["script"] == ["make"]
+    assert sorted(p.name for p in target.parent.iterdir()) == ["ci.yml"]
+
+
+def test_output_mode_follows_umask(tmp_path: Path, runner: CliRunner) -> None:
+    """The output is created 0o666 less the umask, like a plain text write."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    previous = os.umask(0o002)
+    try:
+        result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out), "--no-cache"])
+    finally:
+        os.umask(previous)
+    assert result.exit_code == 0
+    assert stat.S_IMODE(out.stat().st_mode) == 0o664
+
+
+def test_generate_skips_unchanged_input(tmp_path: Path, runner: CliRunner) -> None:
+    """Unchanged input with an untouched output is skipped; edits regenerate."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    args = ["--in", str(mise), "--out", str(out)]
+    assert runner.invoke(GENERATE, args).exit_code == 0
+    assert (tmp_path / ".mise-en-gitlab.cache.json").exists()
+    first = out.read_text(encoding="utf-8")
+    written_ns = out.stat().st_mtime_ns
+
+    result = runner.invoke(GENERATE, args)
+    assert result.exit_code == 0
+    assert "up to date" in result.output
+    assert out.stat().st_mtime_ns == written_ns
+
+    # Same content under a new mtime is still fresh and refreshes the entry.
+    os.utime(mise, ns=(written_ns + 10**9, written_ns + 10**9))
+    cache = tmp_path / ".mise-en-gitlab.cache.json"
+    assert "up to date" in runner.invoke(GENERATE, args).output
+    assert (
+        json.loads(cache.read_text(encoding="utf-8"))["input_mtime_ns"] == written_ns + 10**9
+    )
+    assert out.stat().st_mtime_ns == written_ns
+
+    out.unlink()
+    assert runner.invoke(GENERATE, args).exit_code == 0
+    assert out.read_text(encoding="utf-8") == first
+
+    write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make all"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    assert runner.invoke(GENERATE, args).exit_code == 0
+    data = load_yaml(out)
+    assert data["build"]["script"] == ["make all"]
+
+
+def test_same_size_edit_hashes_input_once(
+    tmp_path: Path, runner: CliRunner, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An edit that keeps the input size is detected with a single hash of the input."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make a"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    args = ["--in", str(mise), "--out", str(out)]
+    assert runner.invoke(GENERATE, args).exit_code == 0
+
+    write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make b"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    hashed: list[Path] = []
+
+    def sha256(path: Path) -> str:
+        hashed.append(path)
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    monkeypatch.setattr("mise_en_gitlab.cache._sha256", sha256)
+    result = runner.invoke(GENERATE, args)
+    assert result.exit_code == 0
+    assert "up to date" not in result.output
+    assert load_yaml(out)["build"]["script"] == ["make b"]
+    assert hashed == [mise]
+
+
+def test_generate_no_cache_skips_sidecar(tmp_path: Path, runner: CliRunner) -> None:
+    """--no-cache regenerates without writing the sidecar cache."""
+    mise = write_fixture(
+        tmp_path,
+        "mise.toml",
+        """
+        [tasks.build]
+        run = "make"
+        [gitlab-ci.jobs.build]
+        stage = "build"
+        """,
+    )
+    out = tmp_path / "ci.yml"
+    result = runner.invoke(GENERATE, ["--in", str(mise), "--out", str(out), "--no-cache"])
+    assert result.exit_code == 0
+    assert out.exists()
+    assert not (tmp_path / ".mise-en-gitlab.cache.json").exists()
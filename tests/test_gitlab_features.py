@@ -5,40 +5,62 @@
 
 from __future__ import annotations
 
-from textwrap import dedent
-from typing import TYPE_CHECKING
-
+import operator
+import tempfile
+from functools import lru_cache, reduce
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any
+
+import click
+import pytest
 import yaml
-from click.testing import CliRunner
-
-from mise_en_gitlab.cli import mise_en_gitlab
-
-if TYPE_CHECKING:
-    from pathlib import Path
 
-
-def _write(tmp_path: Path, name: str, content: str) -> Path:
-    p = tmp_path / name
-    p.write_text(dedent(content).strip() + "\n", encoding="utf-8")
-    return p
+from mise_en_gitlab.core import (
+    _SPECIALIZE_AFTER,
+    _build_job,
+    _compile_job_builder,
+    _job_builder_for,
+    build_gitlab_ci_structure,
+)
+from tests.helpers import GENERATE, load_yaml, write_fixture
+
+
+def _invoke_generate(tmp_path: Path, mise_text: str) -> tuple[int, Path]:
+    """Run `generate` by calling its callback directly, skipping CliRunner's I/O capture."""
+    mise = write_fixture(tmp_path, "mise.toml", mise_text)
+    out = tmp_path / "generated-ci.yml"
+    assert GENERATE.callback is not None
+    try:
+        GENERATE.callback(in_path=str(mise), out_path=str(out), no_cache=False, verbose=False)
+    except click.exceptions.Exit as exc:
+        return exc.exit_code, out
+    except click.ClickException as exc:
+        return exc.exit_code, out
+    return 0, out
+
+
+@lru_cache(maxsize=None)
+def _generate_cached(mise_text: str) -> tuple[int, bytes | None]:
+    """Generate once per unique fixture text; returns the exit code and YAML, if written."""
+    with tempfile.TemporaryDirectory() as tmp:
+        exit_code, out = _invoke_generate(Path(tmp), mise_text)
+        # Error paths write nothing, so they skip reading YAML back entirely.
+        return exit_code, out.read_bytes() if out.exists() else None
 
 
 def _run_generate(
     tmp_path: Path, mise_text: str, out_name: str = "generated-ci.yml"
 ) -> tuple[int, Path]:
-    mise = _write(tmp_path, "mise.toml", mise_text)
+    """Return the (cached) exit code, with any written YAML replayed into `tmp_path`."""
+    exit_code, yaml_bytes = _generate_cached(mise_text)
     out = tmp_path / out_name
-    result = CliRunner().invoke(
-        mise_en_gitlab, ["generate", "--in", str(mise), "--out", str(out)]
-    )
-    return result.exit_code, out
+    if yaml_bytes is not None:
+        out.write_bytes(yaml_bytes)
+    return exit_code, out
 
 
-def test_job_pass_through_common_fields(tmp_path: Path) -> None:
-    """Ensure common GitLab keys are passed through and normalized."""
-    exit_code, out = _run_generate(
-        tmp_path,
-        """
+_PASSTHROUGH_TOML = """
         [tasks.build]
         run = ["echo a", "echo b"]
 
@@ -80,44 +102,57 @@ def test_job_pass_through_common_fields(tmp_path: Path) -> None:
           { if = "'$CI_COMMIT_TAG'" },
           { when = "manual" }
         ]
-        """,
-    )
+        """
+
+# Dotted path into the generated document -> expected value.
+_PASSTHROUGH_EXPECTED: dict[str, Any] = {
+    "stages": ["build", "test", "deploy"],
+    "build.stage": "build",
+    "build.before_script": ["echo before"],
+    "build.after_script": ["echo after"],
+    "build.script": ["echo a", "echo b"],
+    "build.tags": ["docker"],
+    "build.timeout": "30m",
+    "build.retry": {"max": 2, "when": ["runner_system_failure"]},
+    "build.interruptible": True,
+    "build.allow_failure": False,
+    "build.when": "on_success",
+    "build.resource_group": "rg-1",
+    "build.parallel": 2,
+    "build.services": ["postgres:15"],
+    "build.variables.TZ": "UTC",
+    "build.artifacts.paths": ["dist/"],
+    "build.artifacts.when": "always",
+    "build.artifacts.expire_in": "1 week",
+    "build.artifacts.reports.dotenv": ".env",
+    "test.stage": "test",
+    "test.needs": ["build"],
+    "test.image": "python:3.12",
+    "test.script": ["pytest -q"],
+    "deploy.stage": "deploy",
+    "deploy.rules": [{"if": "'$CI_COMMIT_TAG'"}, {"when": "manual"}],
+    "deploy.script": ["./deploy.sh"],
+}
+
+
+@pytest.fixture(name="passthrough_ci", scope="module")
+def _passthrough_ci(tmp_path_factory: pytest.TempPathFactory) -> dict[str, Any]:
+    """Generate and parse the pass-through document once for the whole module."""
+    exit_code, out = _run_generate(tmp_path_factory.mktemp("passthrough"), _PASSTHROUGH_TOML)
     assert exit_code == 0
-    assert out.exists()
-
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
-    assert data["stages"] == ["build", "test", "deploy"]
-
-    build = data["build"]
-    assert build["stage"] == "build"
-    assert build["before_script"] == ["echo before"]
-    assert build["after_script"] == ["echo after"]
-    assert build["script"] == ["echo a", "echo b"]
-    assert build["tags"] == ["docker"]
-    assert build["timeout"] == "30m"
-    assert build["retry"] == {"max": 2, "when": ["runner_system_failure"]}
-    assert build["interruptible"] is True
-    assert build["allow_failure"] is False
-    assert build["when"] == "on_success"
-    assert build["resource_group"] == "rg-1"
-    assert build["parallel"] == 2
-    assert build["services"] == ["postgres:15"]
-    assert build["variables"]["TZ"] == "UTC"
-    assert build["artifacts"]["paths"] == ["dist/"]
-    assert build["artifacts"]["when"] == "always"
-    assert build["artifacts"]["expire_in"] == "1 week"
-    assert build["artifacts"]["reports"]["dotenv"] == ".env"
-
-    test_job = data["test"]
-    assert test_job["stage"] == "test"
-    assert test_job["needs"] == ["build"]
-    assert test_job["image"] == "python:3.12"
-    assert test_job["script"] == ["pytest -q"]
-
-    deploy = data["deploy"]
-    assert deploy["stage"] == "deploy"
-    assert deploy["rules"] == [{"if": "'$CI_COMMIT_TAG'"}, {"when": "manual"}]
-    assert deploy["script"] == ["./deploy.sh"]
+    return load_yaml(out)
+
+
+@pytest.mark.parametrize(
+    ("path", "expected"), list(_PASSTHROUGH_EXPECTED.items()), ids=list(_PASSTHROUGH_EXPECTED)
+)
+def test_job_pass_through_common_fields(
+    passthrough_ci: dict[str, Any], path: str, expected: Any
+) -> None:
+    """Ensure common GitLab keys are passed through and normalized."""
+    value = reduce(operator.getitem, path.split("."), passthrough_ci)
+    assert value == expected
+    assert type(value) is type(expected)  # e.g. True must not come back as 1
 
 
 def test_rules_string_and_artifacts_list_normalization(tmp_path: Path) -> None:
@@ -142,7 +177,7 @@ def test_rules_string_and_artifacts_list_normalization(tmp_path: Path) -> None:
         """,
     )
     assert exit_code == 0
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    data = load_yaml(out)
     assert data["stages"] == ["build"]
 
     assert data["a"]["rules"] == [{"if": "'$CI_PIPELINE_SOURCE' == 'push'"}]
@@ -172,7 +207,7 @@ def test_job_name_rename(tmp_path: Path) -> None:
         """,
     )
     assert exit_code == 0
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    data = load_yaml(out)
     assert data["stages"] == ["build", "test"]
     assert "build-js" in data
     assert "build" not in data  # renamed job key
@@ -193,7 +228,7 @@ def test_task_dir_prepends_cd(tmp_path: Path) -> None:
         """,
     )
     assert exit_code == 0
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    data = load_yaml(out)
     assert data["stages"] == ["build"]
     assert data["build"]["script"] == ["cd a_dir", "make build"]
 
@@ -218,7 +253,7 @@ def test_non_ci_tasks_ignored_and_stage_dedup(tmp_path: Path) -> None:
         """,
     )
     assert exit_code == 0
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    data = load_yaml(out)
     assert data["stages"] == ["build"]
     assert "one" in data
     assert "two" in data
@@ -246,56 +281,197 @@ def test_defaults_image_applied_and_overridden(tmp_path: Path) -> None:
         """,
     )
     assert exit_code == 0
-    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    data = load_yaml(out)
     assert data["stages"] == ["build", "test"]
     assert data["build"]["image"] == "alpine:3.19"
     assert data["test"]["image"] == "python:3.12"
 
 
-def test_invalid_needs_type_exit_2(tmp_path: Path) -> None:
-    """'needs' must be a list of strings."""
-    exit_code, out = _run_generate(
-        tmp_path,
-        """
-        [tasks.x]
-        run = "echo hi"
-        [gitlab-ci.jobs.x]
-        stage = "build"
-        needs = "build"
-        """,
-        out_name="ci.yml",
-    )
+@pytest.mark.parametrize(
+    "mise_text",
+    [
+        pytest.param(
+            """
+            [tasks.x]
+            run = "echo hi"
+            [gitlab-ci.jobs.x]
+            stage = "build"
+            needs = "build"
+            """,
+            id="needs-not-a-list",
+        ),
+        pytest.param(
+            """
+            [tasks.x]
+            run = "echo hi"
+            [gitlab-ci.jobs.x]
+            stage = "build"
+            needs = ["missing"]
+            """,
+            id="needs-unknown-job",
+        ),
+        pytest.param(
+            """
+            [tasks.x]
+            [gitlab-ci.jobs.x]
+            stage = "build"
+            """,
+            id="missing-run",
+        ),
+        pytest.param(
+            """
+            [tasks.x]
+            run = "echo hi"
+            [gitlab-ci.jobs.x]
+            stage = "build"
+            rules = [1, "if: '$CI_COMMIT_BRANCH' == 'main'"]
+            """,
+            id="rules-invalid-item",
+        ),
+        pytest.param(
+            """
+            [tasks.stages]
+            run = "echo hi"
+            [gitlab-ci.jobs.stages]
+            stage = "build"
+            """,
+            id="job-named-stages",
+        ),
+        pytest.param(
+            """
+            [tasks.x]
+            run = "echo hi"
+            [gitlab-ci.jobs.x]
+            stage = "build"
+            name = "stages"
+            needs = []
+            """,
+            id="job-renamed-stages",
+        ),
+    ],
+)
+def test_schema_error_exit_2(tmp_path: Path, mise_text: str) -> None:
+    """Schema violations exit with code 2 and write no output."""
+    exit_code, out = _run_generate(tmp_path, mise_text, out_name="ci.yml")
     assert exit_code == 2
     assert not out.exists()
 
 
-def test_missing_run_in_ci_exit_2(tmp_path: Path) -> None:
-    """CI-annotated task without 'run' should error."""
-    exit_code, out = _run_generate(
-        tmp_path,
-        """
-        [tasks.x]
-        [gitlab-ci.jobs.x]
+def test_many_jobs_with_same_layout_render_expected_yaml(tmp_path: Path) -> None:
+    """Jobs past the specialization threshold still render the expected YAML."""
+    blocks = [
+        f"""
+        [tasks.job{i}]
+        run = "echo {i}"
+        [gitlab-ci.jobs.job{i}]
         stage = "build"
-        """,
-        out_name="ci.yml",
-    )
-    assert exit_code == 2
-    assert not out.exists()
-
-
-def test_rules_invalid_item_exit_2(tmp_path: Path) -> None:
-    """rules must be strings or dicts."""
-    exit_code, out = _run_generate(
-        tmp_path,
+        rules = ["if: '$CI_COMMIT_TAG'"]
+        tags = ["docker"]
+        needs = ["job0"]
         """
-        [tasks.x]
-        run = "echo hi"
-        [gitlab-ci.jobs.x]
-        stage = "build"
-        rules = [1, "if: '$CI_COMMIT_BRANCH' == 'main'"]
-        """,
-        out_name="ci.yml",
+        for i in range(40)
+    ]
+    exit_code, out = _run_generate(
+        tmp_path, '[gitlab-ci.defaults]\nimage = "alpine:3"\n' + "".join(blocks)
     )
-    assert exit_code == 2
-    assert not out.exists()
+    assert exit_code == 0
+    data = load_yaml(out)
+    for i in (1, 39):
+        assert list(data[f"job{i}"]) == ["stage", "image", "script", "rules", "tags", "needs"]
+        assert data[f"job{i}"] == {
+            "stage": "build",
+            "image": "alpine:3",
+            "script": [f"echo {i}"],
+            "rules": [{"if": "'$CI_COMMIT_TAG'"}],
+            "tags": ["docker"],
+            "needs": ["job0"],
+        }
+
+
+@pytest.mark.parametrize(
+    "ci",
+    [
+        {"stage": "build"},
+        {"stage": "build", "image": "node:20", "name": "renamed"},
+        {
+            "tags": ["docker"],
+            "stage": "test",
+            "rules": ["if: '$CI_COMMIT_TAG'", {"when": "manual"}],
+            "needs": ["build"],
+            "artifacts": ["dist/"],
+            "timeout": "10m",
+        },
+        {"stage": "test", "rules": [], "needs": [], "artifacts": {}},
+    ],
+    ids=["stage-only", "image-and-rename", "rules-needs-passthrough", "empty-normalized"],
+)
+@pytest.mark.parametrize("default_image", [None, "alpine:3"])
+def test_specialized_job_builder_matches_generic_build(
+    ci: dict[str, Any], default_image: str | None
+) -> None:
+    """Past the threshold the compiled builder is used and builds the same job."""
+    shapes: dict[tuple[str, ...], int] = {}
+    builders = [_job_builder_for(ci, shapes) for _ in range(_SPECIALIZE_AFTER + 1)]
+    assert all(builder is _build_job for builder in builders[:-1])
+    assert builders[-1] is _compile_job_builder(tuple(ci))
+
+    task_body = {"run": ["make", "make check"], "dir": "app"}
+    specialized = builders[-1](task_body, ci, default_image=default_image)
+    generic = _build_job(task_body, ci, default_image=default_image)
+    assert specialized == generic
+    assert list(specialized) == list(generic)
+
+
+def test_non_dict_mapping_tables_are_processed() -> None:
+    """Tables given as other Mapping types are handled like plain dicts."""
+    job = MappingProxyType(
+        {
+            "stage": "build",
+            "rules": [MappingProxyType({"if": "$CI_COMMIT_TAG"})],
+            "artifacts": MappingProxyType({"paths": ["dist/"]}),
+        }
+    )
+    data = MappingProxyType(
+        {
+            "tasks": MappingProxyType({"build": MappingProxyType({"run": "make"})}),
+            "gitlab-ci": MappingProxyType({"jobs": MappingProxyType({"build": job})}),
+        }
+    )
+    result = build_gitlab_ci_structure(data)
+    assert result.jobs == ["build"]
+    assert yaml.safe_load(result.yaml_text)["build"] == {
+        "stage": "build",
+        "script": ["make"],
+        "rules": [{"if": "$CI_COMMIT_TAG"}],
+        "artifacts": {"paths": ["dist/"]},
+    }
+
+
+class _Array(list):
+    """A list subclass, like the arrays some TOML libraries return."""
+
+
+def test_list_subclass_arrays_are_processed() -> None:
+    """Arrays given as list subclasses are handled like plain lists."""
+    data = {
+        "tasks": {"build": {"run": _Array(["make", "make check"])}, "test": {"run": "pytest"}},
+        "gitlab-ci": {
+            "jobs": {
+                "build": {
+                    "stage": "build",
+                    "rules": _Array(["if: '$CI_COMMIT_TAG'"]),
+                    "artifacts": _Array(["dist/"]),
+                },
+                "test": {"stage": "test", "needs": _Array(["build"]), "name": "test"},
+            }
+        },
+    }
+    result = build_gitlab_ci_structure(data)
+    out = yaml.safe_load(result.yaml_text)
+    assert out["build"] == {
+        "stage": "build",
+        "script": ["make", "make check"],
+        "rules": [{"if": "'$CI_COMMIT_TAG'"}],
+        "artifacts": {"paths": ["dist/"]},
+    }
+    assert out["test"]["needs"] == ["build"]